@@ -1,11 +1,26 @@
+import hashlib
+import json
 import logging
-from langchain_google_genai import ChatGoogleGenerativeAI
+import os
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
 from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
 
+# PDFium (C++) is several times faster than pure-Python pypdf; use it when installed
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
 logger = logging.getLogger(__name__)
 
+# PDFium isn't thread-safe, even across separate documents; serialize every call into it
+_pdfium_lock = threading.Lock()
+
 LATEX_TEMPLATE = r"""\documentclass[a4paper,10pt]{article}
 \usepackage[left=0.5in, right=0.5in, top=0.5in, bottom=0.5in]{geometry}
 \usepackage{enumitem}
@@ -67,104 +82,190 @@ INSERT_DEGREE \hfill GPA: INSERT_GPA
 
 \end{document}"""
 
-class ResumeAgent:
-    def __init__(self, api_key):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0.2,
-            google_api_key=api_key,
-            max_retries=2
-        )
-        logger.info("🤖 ResumeAgent initialized with gemini-2.5-flash")
+# On-disk memo of JSON Gemini results. Keys include the prompt's text, so editing a prompt
+# invalidates its entries; bump CACHE_VERSION for other changes (e.g. model or output parsing)
+GEMINI_CACHE_DIR = Path(__file__).parent.resolve() / ".cache" / "gemini"
+CACHE_VERSION = 2
 
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
-    def evaluate_job_match(self, resume_text, jd_text):
-        """Evaluates how well the resume matches the JD (0-100 score)."""
-        logger.info("🔍 STARTING: Job Qualification Match LLM Chain")
-        template = """
-        You are an expert Technical Recruiter evaluating a candidate's fit for a role.
-        
-        JOB DESCRIPTION:
-        {jd}
+# Max job descriptions scored in a single Gemini request (keeps the JSON reply well under output limits)
+MATCH_BATCH_SIZE = 8
+
+# Markdown fences Gemini wraps around generated code (```latex ... ```)
+CODE_FENCE_RE = re.compile(r"```(?:latex)?")
+
+
+def clean_latex_code(latex_code):
+    """Strips markdown code fences from LLM-generated LaTeX in a single pass."""
+    return CODE_FENCE_RE.sub("", latex_code).strip()
+
+
+def gemini_cache_enabled():
+    """Set JOBSEE_NO_CACHE=1 to always hit Gemini (e.g. while iterating on prompts)."""
+    return os.getenv("JOBSEE_NO_CACHE", "").strip().lower() not in ("1", "true", "yes")
+
+
+def _gemini_cache_path(kind, prompt, texts):
+    digest = hashlib.sha256(f"{kind}:v{CACHE_VERSION}".encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.pretty_repr().encode("utf-8"))
+    for text in texts:
+        digest.update(b"\0")
+        digest.update((text or "").encode("utf-8"))
+    return GEMINI_CACHE_DIR / f"{kind}_{digest.hexdigest()}.json"
+
+
+def read_gemini_cache(kind, prompt, texts):
+    """Returns the cached JSON result for these inputs, or None on a miss."""
+    if not gemini_cache_enabled():
+        return None
+    cache_path = _gemini_cache_path(kind, prompt, texts)
+    if not cache_path.exists():
+        return None
+    try:
+        result = json.loads(cache_path.read_text(encoding="utf-8"))
+        logger.info(f"💾 Gemini cache hit ({kind}).")
+        return result
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Ignoring unreadable cache entry {cache_path.name}: {e}")
+        return None
+
+
+def write_gemini_cache(kind, prompt, texts, result):
+    if not gemini_cache_enabled():
+        return
+    cache_path = _gemini_cache_path(kind, prompt, texts)
+    try:
+        GEMINI_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(result), encoding="utf-8")
+        os.replace(tmp_path, cache_path)
+    except (OSError, TypeError) as e:
+        logger.warning(f"⚠️ Could not write Gemini cache entry: {e}")
+
+
+def cached_gemini_json(kind, prompt, texts, compute, validate=None):
+    """
+    Returns compute()'s JSON result, memoized on disk by kind, prompt text and input texts.
+    If validate is given, results failing it are never cached, and cached entries failing it count as misses.
+    """
+    result = read_gemini_cache(kind, prompt, texts)
+    if result is not None and validate is not None and not validate(result):
+        logger.warning(f"⚠️ Ignoring malformed cache entry ({kind}).")
+        result = None
+    if result is None:
+        result = compute()
+        if validate is None or validate(result):
+            write_gemini_cache(kind, prompt, texts, result)
+    return result
+
+
+def normalize_match_result(result):
+    """Returns {"score": int, "reason": str} for a well-formed match result, or None."""
+    if not isinstance(result, dict) or isinstance(result.get("score"), bool):
+        return None
+    try:
+        score = int(result.get("score"))
+    except (TypeError, ValueError):
+        return None
+    return {"score": score, "reason": str(result.get("reason") or "No reason provided.")}
+
+
+def extract_pdf_text(path):
+    """Extracts the text of every page of a PDF, joined with newlines."""
+    if pdfium is not None:
+        with _pdfium_lock:
+            pdf = pdfium.PdfDocument(str(path))
+            try:
+                return "\n".join(page.get_textpage().get_text_range() for page in pdf)
+            finally:
+                pdf.close()
+    from pypdf import PdfReader
+    reader = PdfReader(str(path))
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+@lru_cache(maxsize=4)
+def _load_pdf_text(path, mtime):
+    return extract_pdf_text(path)
+
+
+def load_pdf_text(path):
+    """Extracts text from a PDF, memoized until the file's mtime changes."""
+    path = str(path)
+    return _load_pdf_text(path, os.path.getmtime(path))
+
+
+# Prompts are parsed once at import instead of on every call
+JOB_MATCH_BATCH_PROMPT = ChatPromptTemplate.from_template("""
+        You are an expert Technical Recruiter evaluating a candidate's fit for several roles.
         
         RESUME CONTENT:
         {resume}
         
+        JOB DESCRIPTIONS ({count} total, each starting with a "=== JOB <n> ===" marker):
+        {jobs}
+        
         TASK:
-        Rate how qualified the candidate is for this exact job description from 0 to 100.
-        Be extremely honest and critical. If the JD requires 5 years of an obscure language and the candidate has 0, score them low.
-        Output EXACTLY a JSON object with two keys:
+        For EACH job description, rate how qualified the candidate is for that exact job from 0 to 100.
+        Be extremely honest and critical. If a JD requires 5 years of an obscure language and the candidate has 0, score them low.
+        Output EXACTLY a JSON array of {count} objects, in the same order as the jobs, each with two keys:
         - "score": integer from 0 to 100
         - "reason": a 1-sentence explanation of why they got this score (focus on biggest strengths/weaknesses).
         
-        Example Output:
-        {{"score": 85, "reason": "Strong match for Python and AWS, but lacks the required Kubernetes experience."}}
-        """
-        from langchain_core.output_parsers import JsonOutputParser
-        prompt = ChatPromptTemplate.from_template(template)
-        chain = prompt | self.llm | JsonOutputParser()
-        try:
-            return chain.invoke({"jd": jd_text, "resume": resume_text})
-        except Exception as e:
-            logger.error(f"❌ ERROR in Job Qualification Match: {e}")
-            raise e # Let tenacity retry
+        Example Output for 2 jobs:
+        [{{"score": 85, "reason": "Strong match for Python and AWS, but lacks the required Kubernetes experience."}}, {{"score": 30, "reason": "Role is frontend-heavy and the candidate has no React experience."}}]
+        """)
 
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
-    def analyze_gaps(self, resume_text, jd_text):
-        """Analyzes the resume against the JD."""
-        logger.info("🔍 STARTING: Gap Analysis LLM Chain")
-        template = """
-        You are an expert Technical Recruiter.
-        JOB DESCRIPTION: {jd}
-        RESUME CONTENT: {resume}
-        TASK:
-        Identify the gaps. Output a concise analysis:
+# Shared by the standalone prompts and APPLICATION_PROMPT so the two paths can't drift apart
+GAP_ANALYSIS_INSTRUCTIONS = """
         1. **Missing Keywords**: List 3-5 specific hard skills/tools from JD missing in Resume.
         2. **Summary Update**: Draft a specific, 2-sentence professional summary tailored to this JD.
-        3. **Experience Enhancements**: Identify 1 weak bullet point and provide a rewrite using the STAR method.
-        """
-        prompt = ChatPromptTemplate.from_template(template)
-        chain = prompt | self.llm | StrOutputParser()
-        try:
-            return chain.invoke({"jd": jd_text, "resume": resume_text})
-        except Exception as e:
-            logger.error(f"❌ ERROR in Gap Analysis: {e}")
-            raise
+        3. **Experience Enhancements**: Identify 1 weak bullet point and provide a rewrite using the STAR method."""
 
-    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
-    def generate_cover_letter(self, resume_text, jd_text):
-        """Generates a professional cover letter based on Resume and JD."""
-        logger.info("✍️ STARTING: Cover Letter Generation LLM Chain")
-        template = """
-        You are an expert Career Coach and Copywriter.
+COVER_LETTER_INSTRUCTIONS = """
         Write a professional, compelling, 3-paragraph cover letter directed at the hiring manager.
         Use details from the provided RESUME to demonstrate fitness for the JOB DESCRIPTION.
         Do not use placeholder brackets for things like [Your Name] unless you have to, try to infer it from the resume.
-        Keep it concise, confident, and focused strictly on value-add.
+        Keep it concise, confident, and focused strictly on value-add."""
+
+GAP_ANALYSIS_PROMPT = ChatPromptTemplate.from_template("""
+        You are an expert Technical Recruiter.
+        JOB DESCRIPTION: {jd}
+        RESUME CONTENT: {resume}
+        TASK:
+        Identify the gaps. Output a concise analysis:""" + GAP_ANALYSIS_INSTRUCTIONS + "\n")
+
+COVER_LETTER_PROMPT = ChatPromptTemplate.from_template("""
+        You are an expert Career Coach and Copywriter.""" + COVER_LETTER_INSTRUCTIONS + """
 
         --- JOB DESCRIPTION ---
         {jd}
         
         --- RESUME ---
         {resume}
-        """
-        prompt = ChatPromptTemplate.from_template(template)
-        chain = prompt | self.llm | StrOutputParser()
-        try:
-            return chain.invoke({"jd": jd_text, "resume": resume_text})
-        except Exception as e:
-            logger.error(f"❌ ERROR in Cover Letter Generation: {e}")
-            raise
+        """)
 
-    def generate_latex(self, resume_text, jd_text, analysis):
-        """Generates the LaTeX code."""
-        logger.info("✍️ STARTING: LaTeX Generation LLM Chain")
-        system_prompt = (
-            "You are a LaTeX Resume Architect. Your task is to populate the provided "
-            "LaTeX template with information from the user's resume, tailoring it "
-            "based on the provided job description and analysis..."
-        )
-        human_prompt = '''
+APPLICATION_PROMPT = ChatPromptTemplate.from_template("""
+        You are an expert Technical Recruiter and Career Coach.
+        JOB DESCRIPTION: {jd}
+        RESUME CONTENT: {resume}
+        TASK:
+        Do BOTH of the following in one response.
+        A) Identify the gaps. Write a concise analysis:""" + GAP_ANALYSIS_INSTRUCTIONS + """
+        B) Cover letter:""" + COVER_LETTER_INSTRUCTIONS + """
+        
+        Output EXACTLY a JSON object with two string keys:
+        - "analysis": the gap analysis from A (markdown allowed)
+        - "cover_letter": the cover letter from B
+        """)
+
+LATEX_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", (
+        "You are a LaTeX Resume Architect. Your task is to populate the provided "
+        "LaTeX template with information from the user's resume, tailoring it "
+        "based on the provided job description and analysis..."
+    )),
+    ("human", '''
         Please fill this LaTeX template:
         --- TEMPLATE START ---
         {latex_template}
@@ -179,14 +280,111 @@ class ResumeAgent:
         --- ANALYSIS ---
         {analysis}
         --- END ANALYSIS ---
-        '''
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_prompt),
-            ("human", human_prompt),
-        ])
-        chain = prompt | self.llm | StrOutputParser()
+        '''),
+])
+
+
+@lru_cache(maxsize=4)
+def get_resume_agent(api_key):
+    """Returns a shared ResumeAgent per API key instead of rebuilding the Gemini client for every job."""
+    return ResumeAgent(api_key)
+
+
+class ResumeAgent:
+    def __init__(self, api_key):
+        # Imported lazily: the Gemini SDK (gRPC/protobuf) is slow to import and
+        # only needed once a request actually calls Gemini
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        self.llm = ChatGoogleGenerativeAI(
+            model="gemini-2.5-flash",
+            temperature=0.2,
+            google_api_key=api_key,
+            max_retries=2
+        )
+        self.match_batch_chain = JOB_MATCH_BATCH_PROMPT | self.llm | JsonOutputParser()
+        self.gap_chain = GAP_ANALYSIS_PROMPT | self.llm | StrOutputParser()
+        self.cover_letter_chain = COVER_LETTER_PROMPT | self.llm | StrOutputParser()
+        self.application_chain = APPLICATION_PROMPT | self.llm | JsonOutputParser()
+        self.latex_chain = LATEX_PROMPT | self.llm | StrOutputParser()
+        logger.info("🤖 ResumeAgent initialized with gemini-2.5-flash")
+
+    def evaluate_job_matches(self, resume_text, jd_texts, before_call=None):
+        """
+        Evaluates several JDs against the resume, sending only uncached ones to Gemini in batches.
+        before_call (e.g. a rate limiter) runs before each batch that is actually sent.
+        """
+        # Malformed entries (e.g. cached before validation existed) count as misses
+        results = [normalize_match_result(read_gemini_cache("job_match", JOB_MATCH_BATCH_PROMPT, (resume_text, jd))) for jd in jd_texts]
+        pending = [i for i, result in enumerate(results) if result is None]
+        for start in range(0, len(pending), MATCH_BATCH_SIZE):
+            chunk = pending[start:start + MATCH_BATCH_SIZE]
+            if before_call is not None:
+                before_call()
+            scores = self._evaluate_job_match_batch(resume_text, [jd_texts[i] for i in chunk])
+            for i, score in zip(chunk, scores):
+                write_gemini_cache("job_match", JOB_MATCH_BATCH_PROMPT, (resume_text, jd_texts[i]), score)
+                results[i] = score
+        return results
+
+    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
+    def _evaluate_job_match_batch(self, resume_text, jd_texts):
+        logger.info(f"🔍 STARTING: Batched Job Qualification Match LLM Chain ({len(jd_texts)} jobs)")
+        jobs = "\n\n".join(f"=== JOB {n} ===\n{jd or ''}" for n, jd in enumerate(jd_texts, 1))
+        try:
+            scores = self.match_batch_chain.invoke({"resume": resume_text, "jobs": jobs, "count": len(jd_texts)})
+        except Exception as e:
+            logger.error(f"❌ ERROR in Batched Job Qualification Match: {e}")
+            raise
+        if not isinstance(scores, list) or len(scores) != len(jd_texts):
+            # Can't map results back to jobs reliably; let tenacity retry
+            raise ValueError(f"Expected {len(jd_texts)} match results, got: {str(scores)[:200]}")
+        normalized = [normalize_match_result(score) for score in scores]
+        if any(result is None for result in normalized):
+            # Never cache or return e.g. [85, 30]; let tenacity retry
+            raise ValueError(f"Match results must be objects with an integer score, got: {str(scores)[:200]}")
+        return normalized
+
+    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
+    def analyze_gaps(self, resume_text, jd_text):
+        """Analyzes the resume against the JD."""
+        logger.info("🔍 STARTING: Gap Analysis LLM Chain")
+        try:
+            return self.gap_chain.invoke({"jd": jd_text, "resume": resume_text})
+        except Exception as e:
+            logger.error(f"❌ ERROR in Gap Analysis: {e}")
+            raise
+
+    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
+    def generate_cover_letter(self, resume_text, jd_text):
+        """Generates a professional cover letter based on Resume and JD."""
+        logger.info("✍️ STARTING: Cover Letter Generation LLM Chain")
+        try:
+            return self.cover_letter_chain.invoke({"jd": jd_text, "resume": resume_text})
+        except Exception as e:
+            logger.error(f"❌ ERROR in Cover Letter Generation: {e}")
+            raise
+
+    @retry(wait=wait_exponential(multiplier=1, min=4, max=10), stop=stop_after_attempt(3))
+    def prepare_application(self, resume_text, jd_text):
+        """Gap analysis and cover letter from a single pass over the Resume and JD."""
+        logger.info("✍️ STARTING: Combined Gap Analysis + Cover Letter LLM Chain")
+        try:
+            result = self.application_chain.invoke({"jd": jd_text, "resume": resume_text})
+        except Exception as e:
+            logger.error(f"❌ ERROR in Combined Gap Analysis + Cover Letter: {e}")
+            raise
+        if not isinstance(result, dict) or not all(
+            isinstance(result.get(key), str) and result[key].strip() for key in ("analysis", "cover_letter")
+        ):
+            # e.g. a nested dict for "analysis" would otherwise be str()'d into the output files; let tenacity retry
+            raise ValueError(f"Incomplete application output: {str(result)[:200]}")
+        return result
+
+    def generate_latex(self, resume_text, jd_text, analysis):
+        """Generates the LaTeX code."""
+        logger.info("✍️ STARTING: LaTeX Generation LLM Chain")
         try:
-            return chain.invoke({
+            return self.latex_chain.invoke({
                 "latex_template": LATEX_TEMPLATE,
                 "resume": resume_text,
                 "jd": jd_text,
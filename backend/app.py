@@ -56,6 +56,7 @@ with tab3:
     with col2:
         skills = st.text_input("Skills/Keywords", value=config.get('skills', 'Python, React'))
         interval = st.number_input("Discovery Interval (mins)", min_value=1, value=config.get('interval_minutes', 60))
+        workers = st.number_input("Parallel Workers", min_value=1, max_value=8, value=config.get('workers', 1), help="Jobs processed concurrently. Gemini calls stay rate-limited across all workers.")
 
     st.divider()
     api_key = st.text_input("Google Gemini API Key", type="password", value=config.get('api_key', ''))
@@ -74,6 +75,7 @@ with tab3:
             "location": location,
             "skills": skills,
             "interval_minutes": interval,
+            "workers": workers,
             "api_key": api_key
         }
         save_config(new_config)
@@ -92,6 +94,7 @@ with tab1:
                 current_config = load_config()
                 payload = {
                     "interval_minutes": current_config.get("interval_minutes", 60),
+                    "workers": current_config.get("workers", 1),
                     "api_key": current_config.get("api_key", "")
                 }
                 res = requests.post(f"{FASTAPI_URL}/agent/start", json=payload)
@@ -0,0 +1,204 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+from ai_services import LATEX_TEMPLATE
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_ENGINES = ("pdflatex", "tectonic")
+
+PDFLATEX_FLAGS = ["-interaction=batchmode", "-halt-on-error", "-no-shell-escape"]
+
+# Commands that need a second pass to resolve (refs, toc, citations).
+MULTIPASS_RE = re.compile(r"\\(?:ref|pageref|eqref|cite|tableofcontents|listoffigures|listoftables)\b")
+
+# Compile in RAM-backed /dev/shm on Linux; elsewhere fall back to the default temp dir
+SCRATCH_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Precompiled pdflatex formats (mylatexformat) for the resume template's preamble
+FORMAT_CACHE_DIR = Path(__file__).parent.resolve() / ".cache" / "latex"
+_format_lock = threading.Lock()
+_broken_formats = set()
+
+# Upper bound on real pdflatex passes after the draft, in case the .aux never settles.
+MAX_FINAL_PASSES = 3
+
+
+def get_latex_engine() -> str:
+    """Reads the engine from JOBSEE_LATEX_ENGINE (pdflatex by default)."""
+    engine = os.getenv("JOBSEE_LATEX_ENGINE", "pdflatex").strip().lower()
+    if engine not in SUPPORTED_ENGINES:
+        logger.warning(f"⚠️ Unknown JOBSEE_LATEX_ENGINE '{engine}', falling back to pdflatex.")
+        return "pdflatex"
+    return engine
+
+
+def check_latex_engine() -> bool:
+    """Checks if the configured LaTeX engine is installed and logs the result."""
+    engine = get_latex_engine()
+    if shutil.which(engine):
+        logger.info(f"✅ LaTeX engine check passed ({engine}).")
+        return True
+    logger.error(f"❌ {engine} binary not found. Please install a TeX distribution (MiKTeX, TeX Live) or Tectonic.")
+    return False
+
+
+def _aux_hash(aux_path: Path):
+    """Returns the sha256 of the .aux file, or None if it doesn't exist yet."""
+    if not aux_path.exists():
+        return None
+    return hashlib.sha256(aux_path.read_bytes()).hexdigest()
+
+
+def needs_multiple_passes(latex_code: str) -> bool:
+    """Checks whether the document references anything that pdflatex resolves via the .aux file."""
+    return bool(MULTIPASS_RE.search(latex_code))
+
+
+def _normalize_preamble(latex_code: str) -> str:
+    """Everything before \\begin{document}, ignoring indentation, blank lines and comment lines."""
+    head = latex_code.split(r"\begin{document}", 1)[0]
+    lines = (line.strip() for line in head.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("%"))
+
+
+TEMPLATE_PREAMBLE = _normalize_preamble(LATEX_TEMPLATE)
+TEMPLATE_FORMAT_NAME = "resume_" + hashlib.sha256(TEMPLATE_PREAMBLE.encode("utf-8")).hexdigest()[:12]
+
+
+def _build_template_format(fmt_path: Path) -> bool:
+    """Dumps the template preamble into a .fmt with mylatexformat. Returns False if that isn't possible."""
+    name = fmt_path.stem
+    with tempfile.TemporaryDirectory(dir=SCRATCH_DIR, prefix="jobsee_fmt_") as work_dir:
+        work_dir = Path(work_dir)
+        preamble = LATEX_TEMPLATE.split(r"\begin{document}", 1)[0]
+        (work_dir / f"{name}.tex").write_text(preamble + "\\begin{document}\n\\end{document}\n", encoding="utf-8")
+        cmd = ["pdflatex", "-ini", "-interaction=batchmode", "-halt-on-error", f"-jobname={name}",
+               "&pdflatex", "mylatexformat.ltx", f"{name}.tex"]
+        result = subprocess.run(cmd, cwd=work_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        built_fmt = work_dir / f"{name}.fmt"
+        if result.returncode != 0 or not built_fmt.exists():
+            return False
+        FORMAT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(built_fmt), str(fmt_path))
+    return True
+
+
+def get_template_format(latex_code: str):
+    """
+    Returns the precompiled .fmt for documents that use the resume template's preamble,
+    building it on first use. Returns None for any other preamble or if the build fails.
+    """
+    if r"\begin{document}" not in latex_code or _normalize_preamble(latex_code) != TEMPLATE_PREAMBLE:
+        return None
+
+    # The name embeds the preamble hash, so editing the template's preamble invalidates the old format
+    fmt_path = FORMAT_CACHE_DIR / f"{TEMPLATE_FORMAT_NAME}.fmt"
+    with _format_lock:
+        if fmt_path.name in _broken_formats:
+            return None
+        if not fmt_path.exists():
+            logger.info("🧱 Precompiling resume preamble with mylatexformat...")
+            if not _build_template_format(fmt_path):
+                logger.warning("⚠️ Could not precompile the resume preamble (is mylatexformat installed?). Compiling without it.")
+                _broken_formats.add(fmt_path.name)
+                return None
+    return fmt_path
+
+
+def _run_engine(tex_name: str, cwd: Path, fmt_name: str = None) -> subprocess.CompletedProcess:
+    if get_latex_engine() == "tectonic":
+        cmd = ["tectonic", "-X", "compile", "--outdir", ".", tex_name]
+        # Tectonic keeps no .log by default; errors only go to stderr, which stays small
+        return subprocess.run(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+    # pdflatex in batchmode writes diagnostics to the .log file, so don't buffer its output
+    flags = [*PDFLATEX_FLAGS, f"-fmt={fmt_name}"] if fmt_name else PDFLATEX_FLAGS
+    cmd = ["pdflatex", *flags, "-output-directory=.", tex_name]
+
+    multipass = needs_multiple_passes((cwd / tex_name).read_text(encoding="utf-8"))
+    aux_path = (cwd / tex_name).with_suffix(".aux")
+    if multipass:
+        # One draft pass writes the .aux; the real pass below then doubles as the settle check
+        draft = subprocess.run(
+            ["pdflatex", "-draftmode", *flags, "-output-directory=.", tex_name],
+            cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        if draft.returncode != 0:
+            return draft
+
+    for _ in range(MAX_FINAL_PASSES):
+        aux_before = _aux_hash(aux_path)
+        result = subprocess.run(cmd, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # toc/pageref entries can shift pages and rewrite the .aux; rerun only if this pass changed it
+        if not multipass or result.returncode != 0 or _aux_hash(aux_path) == aux_before:
+            break
+        logger.info("📑 .aux changed during the final pass, rerunning pdflatex.")
+    return result
+
+
+def compile_latex_to_pdf(tex_path: Path) -> subprocess.CompletedProcess:
+    """
+    Compiles a .tex file into a PDF next to it and returns the final engine run.
+
+    The engine runs in a scratch directory (tmpfs where available) so .aux/.log/.out
+    files never touch the resumes folder and parallel compiles can't collide; only the
+    PDF is moved back, plus the .log when compilation fails.
+
+    With tectonic, reruns and the TeX resource cache are handled by the engine itself.
+    With pdflatex, single-pass documents (like the resume template) get exactly one run. Documents
+    with cross-references get one -draftmode pass, then real passes until one leaves the .aux unchanged.
+    Documents that keep the template's preamble load it from a precompiled format instead
+    of re-parsing \\usepackage lines on every run.
+    """
+    tex_path = Path(tex_path)
+    pdf_path = tex_path.with_suffix(".pdf")
+    pdf_path.unlink(missing_ok=True)
+
+    fmt_path = None
+    if get_latex_engine() == "pdflatex":
+        fmt_path = get_template_format(tex_path.read_text(encoding="utf-8"))
+
+    with tempfile.TemporaryDirectory(dir=SCRATCH_DIR, prefix="jobsee_latex_") as work_dir:
+        work_dir = Path(work_dir)
+        shutil.copy(tex_path, work_dir / tex_path.name)
+
+        if fmt_path:
+            # pdflatex looks for -fmt files in the working directory first
+            try:
+                shutil.copy(fmt_path, work_dir / fmt_path.name)
+            except FileNotFoundError:
+                fmt_path = None  # Removed by a concurrent compile after a failed format load
+
+        if fmt_path:
+            result = _run_engine(tex_path.name, work_dir, fmt_name=fmt_path.stem)
+            if result.returncode != 0:
+                # A stale format (e.g. after a TeX update) fails every compile; retry plain and check
+                (work_dir / tex_path.with_suffix(".aux").name).unlink(missing_ok=True)
+                result = _run_engine(tex_path.name, work_dir)
+                if result.returncode == 0:
+                    logger.warning("⚠️ Precompiled resume format is unusable; removing it and compiling without one.")
+                    with _format_lock:
+                        # Don't rebuild it on the next compile; it would most likely fail the same way
+                        _broken_formats.add(fmt_path.name)
+                        fmt_path.unlink(missing_ok=True)
+        else:
+            result = _run_engine(tex_path.name, work_dir)
+
+        built_pdf = work_dir / pdf_path.name
+        if result.returncode == 0 and built_pdf.exists():
+            shutil.move(str(built_pdf), str(pdf_path))
+        else:
+            built_log = work_dir / tex_path.with_suffix(".log").name
+            if built_log.exists():
+                shutil.copy(built_log, tex_path.with_suffix(".log"))
+
+    return result
@@ -1,5 +1,4 @@
 import os
-import subprocess
 import tempfile
 import logging
 import sys
@@ -11,17 +10,14 @@ import base64
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
 from database import engine, get_db, Base, Job
 from sqlalchemy.orm import Session
 from fastapi import Depends
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from search_agent import start_agent_thread, kill_agent_thread
 
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_community.document_loaders import PyPDFLoader
 from dotenv import load_dotenv
 
 # Get the absolute path to the directory of the current script
@@ -66,20 +62,14 @@ app.add_middleware(
 # ==========================================
 # LATEX AND PDF CHECK
 # ==========================================
-def check_pdflatex():
-    """Checks if pdflatex is installed and logs the result."""
-    if shutil.which("pdflatex"):
-        logger.info("✅ PDFLaTeX check passed.")
-        return True
-    logger.error("❌ PDFLaTeX binary not found. Please install a TeX distribution (MiKTeX, TeX Live).")
-    return False
+from latex_compiler import compile_latex_to_pdf, check_latex_engine
 
-LATEX_INSTALLED = check_pdflatex()
+LATEX_INSTALLED = check_latex_engine()
 
 # ==========================================
 # IMPORT AI SERVICES
 # ==========================================
-from ai_services import ResumeAgent, LATEX_TEMPLATE
+from ai_services import get_resume_agent, clean_latex_code, extract_pdf_text, LATEX_TEMPLATE
 
 # ==========================================
 # API ENDPOINTS
@@ -90,6 +80,7 @@ def read_root():
 
 class AgentSettings(BaseModel):
     interval_minutes: int = 60
+    workers: int = Field(1, ge=1, le=8)
     api_key: str = ""
 
 @app.post("/agent/start")
@@ -99,7 +90,8 @@ def start_agent(settings: AgentSettings):
 
     started = start_agent_thread(
         api_key=settings.api_key,
-        interval_minutes=settings.interval_minutes
+        interval_minutes=settings.interval_minutes,
+        workers=settings.workers
     )
     if started:
         return {"status": "Resume-Driven Job Discovery Agent started! Reading your resume..."}
@@ -143,16 +135,15 @@ async def generate_cover_letter_for_job(
             shutil.copyfileobj(resume_file.file, tmp)
             tmp_path = tmp.name
 
-        loader = PyPDFLoader(tmp_path)
-        raw_text = "\n".join([p.page_content for p in loader.load()])
+        raw_text = await run_in_threadpool(extract_pdf_text, tmp_path)
         
         try:
             os.remove(tmp_path)
         except:
             pass
 
-        agent = ResumeAgent(api_key)
-        cover_letter_text = agent.generate_cover_letter(raw_text, job.description)
+        agent = get_resume_agent(api_key)
+        cover_letter_text = await run_in_threadpool(agent.generate_cover_letter, raw_text, job.description)
 
         job.cover_letter = cover_letter_text
         db.commit()
@@ -169,14 +160,15 @@ async def tailor_resume(
     resume_file: UploadFile = File(...)
 ):
     if not LATEX_INSTALLED:
-        raise HTTPException(status_code=500, detail="PDFLaTeX is not installed on the server.")
+        raise HTTPException(status_code=500, detail="No LaTeX engine (pdflatex/tectonic) is installed on the server.")
     if not api_key:
         raise HTTPException(status_code=400, detail="Google Gemini API Key is required.")
 
-    output_dir = script_dir / "resumes"
-    os.makedirs(output_dir, exist_ok=True)
+    # Blocking work runs in the threadpool, so requests overlap; give each its own
+    # directory and delete it afterwards so uploaded resumes don't pile up on disk
+    work_dir = tempfile.TemporaryDirectory(prefix="jobsee_tailor_")
     try:
-        output_path = Path(output_dir)
+        output_path = Path(work_dir.name)
         resume_path = output_path / "original_resume.pdf"
         tex_path = output_path / "tailored_resume.tex"
         pdf_path = output_path / "tailored_resume.pdf"
@@ -186,38 +178,31 @@ async def tailor_resume(
             shutil.copyfileobj(resume_file.file, buffer)
         
         # Initialize agent
-        agent = ResumeAgent(api_key)
+        agent = get_resume_agent(api_key)
 
         # 1. Extraction
         logger.info("Step 1: Extracting text from PDF...")
-        loader = PyPDFLoader(str(resume_path))
-        raw_text = "\n".join([p.page_content for p in loader.load()])
+        raw_text = await run_in_threadpool(extract_pdf_text, resume_path)
         
         # 2. Analysis
         logger.info("Step 2: Calling Analyst Agent...")
-        analysis = agent.analyze_gaps(raw_text, jd_text)
+        analysis = await run_in_threadpool(agent.analyze_gaps, raw_text, jd_text)
         
         # 3. Code Generation
         logger.info("Step 3: Calling Architect Agent...")
-        latex_code = agent.generate_latex(raw_text, jd_text, analysis)
-        clean_code = latex_code.replace("```latex", "").replace("```", "").strip()
+        latex_code = await run_in_threadpool(agent.generate_latex, raw_text, jd_text, analysis)
+        clean_code = clean_latex_code(latex_code)
         
         with open(tex_path, "w", encoding="utf-8") as f:
             f.write(clean_code)
         
         # 4. Compilation
-        logger.info("Step 4: Compiling with pdflatex...")
-        cmd = ["pdflatex", "-interaction=nonstopmode", "-output-directory=.", tex_path.name]
-        
-        # Run pdflatex. It often needs to be run twice.
-        result = subprocess.run(cmd, cwd=output_dir, capture_output=True, text=True)
-        if Path(pdf_path).exists():
-                # Run again to resolve any cross-references
-                result = subprocess.run(cmd, cwd=output_dir, capture_output=True, text=True)
+        logger.info("Step 4: Compiling LaTeX to PDF...")
+        result = await run_in_threadpool(compile_latex_to_pdf, tex_path)
 
         # Final check for PDF existence and compilation success
         if result.returncode != 0 or not Path(pdf_path).exists():
-            logger.error("❌ PDF generation failed after pdflatex run(s).")
+            logger.error("❌ PDF generation failed after LaTeX run(s).")
             
             log_file_path = tex_path.with_suffix('.log')
             log_content = "Log file not found."
@@ -230,13 +215,12 @@ async def tailor_resume(
             # Combine all info for a detailed error message
             error_details = (
                 f"PDF compilation failed.\n"
-                f"pdflatex return code: {result.returncode}\n\n"
-                f"--- STDOUT ---\n{result.stdout}\n\n"
-                f"--- STDERR ---\n{result.stderr}\n\n"
+                f"LaTeX engine return code: {result.returncode}\n\n"
+                f"--- STDERR ---\n{result.stderr or '(not captured)'}\n\n"
                 f"--- LATEX LOG (from {log_file_path}) ---\n{log_content[-2000:]}" # Log last 2000 chars
             )
             logger.error(error_details)
-            # This exception will be caught by the outer `except` and trigger cleanup
+            # This exception will be caught by the outer `except`; `finally` removes the files
             raise Exception("PDF compilation failed. The LaTeX code generated by the AI may be invalid. Check server logs for details.")
 
         logger.info("✅ PDF successfully created.")
@@ -252,10 +236,11 @@ async def tailor_resume(
         })
 
     except Exception as e:
-        # If any exception occurs, clean up the directory and then re-raise
         logger.exception("CRITICAL APP FAILURE")
         # Raise as HTTPException to be sent to the client
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        work_dir.cleanup()
     
 if __name__ == "__main__":
     import uvicorn
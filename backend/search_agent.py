@@ -5,20 +5,20 @@ import logging
 import json
 import os
 import requests
-import subprocess
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pathlib import Path
 from ddgs import DDGS
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from sqlalchemy.orm import Session
 
 from database import SessionLocal, Job
 from datetime import datetime
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_community.document_loaders import PyPDFLoader
 
-from ai_services import ResumeAgent
+from ai_services import get_resume_agent, load_pdf_text, clean_latex_code, cached_gemini_json, MATCH_BATCH_SIZE
+from latex_compiler import compile_latex_to_pdf
 
 logger = logging.getLogger(__name__)
 
@@ -26,33 +26,43 @@ logger = logging.getLogger(__name__)
 KILL_SWITCH_EVENT = threading.Event()
 JOB_PROCESS_QUEUE = queue.Queue()
 
+# Shared Gemini throttle so parallel workers stay within the free tier (~10 RPM)
+GEMINI_MIN_INTERVAL = 8
+_gemini_rate_lock = threading.Lock()
+_gemini_next_call_at = 0.0
+
 # Cache for extracted resume profile so we don't re-parse every cycle
 _resume_profile_cache = None
 
-BASE_RESUME_PATH = Path(__file__).parent.resolve() / "resumes" / "base_resume.pdf"
-
-
-def extract_resume_profile(api_key: str):
-    """Reads the base resume PDF and uses Gemini to extract a structured profile."""
-    global _resume_profile_cache
-    if _resume_profile_cache:
-        return _resume_profile_cache
+# Only build a tree for <body>; <head> scripts/styles/meta are thrown away anyway
+BODY_STRAINER = SoupStrainer("body")
+NOISE_TAGS = ["script", "style", "nav", "footer", "header"]
+
+# Shared pooled session for JD scraping: keeps TLS connections to LinkedIn/Naukri alive
+# across jobs and workers, and retries transient failures with backoff
+SCRAPE_SESSION = requests.Session()
+SCRAPE_SESSION.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"})
+_scrape_adapter = HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=20,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"]
+    )
+)
+SCRAPE_SESSION.mount("https://", _scrape_adapter)
+SCRAPE_SESSION.mount("http://", _scrape_adapter)
 
-    if not BASE_RESUME_PATH.exists():
-        logger.error("❌ No base_resume.pdf found! Upload it via the Settings tab.")
-        return None
+# Cap on downloaded HTML per job page; the JD text is truncated to 12k chars anyway
+MAX_SCRAPE_BYTES = 2_000_000
 
-    logger.info("📄 Reading base_resume.pdf to build candidate profile...")
-    loader = PyPDFLoader(str(BASE_RESUME_PATH))
-    raw_text = "\n".join([p.page_content for p in loader.load()])
+BASE_RESUME_PATH = Path(__file__).parent.resolve() / "resumes" / "base_resume.pdf"
 
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        temperature=0.1,
-        google_api_key=api_key
-    )
 
-    template = """
+# Prompts are parsed once at import instead of on every call
+RESUME_PROFILE_PROMPT = ChatPromptTemplate.from_template("""
     You are an expert Resume Parser.
     
     Given the following resume text, extract a structured profile.
@@ -69,36 +79,9 @@ def extract_resume_profile(api_key: str):
     - "domains": list of 2-3 industry domains they have experience in (e.g. "FinTech", "Healthcare", "SaaS")
     
     Output ONLY valid JSON. No markdown, no extra text.
-    """
-    prompt = ChatPromptTemplate.from_template(template)
-    chain = prompt | llm | JsonOutputParser()
-
-    try:
-        profile = chain.invoke({"resume": raw_text})
-        logger.info(f"✅ Resume Profile Extracted: {profile.get('primary_role')} | Skills: {profile.get('top_skills')}")
-        _resume_profile_cache = profile
-        _resume_profile_cache["raw_text"] = raw_text
-        time.sleep(5)  # Cooldown after profile extraction call
-        return _resume_profile_cache
-    except Exception as e:
-        logger.error(f"❌ Failed to extract resume profile: {e}")
-        return None
-
-
-class JobDiscoveryAgent:
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash",
-            temperature=0.3,
-            google_api_key=api_key
-        )
+    """)
 
-    def generate_resume_queries(self, profile: dict):
-        """Uses the extracted resume profile to generate highly targeted search queries."""
-        logger.info("🧠 Generating resume-driven search queries...")
-
-        template = """
+SEARCH_QUERIES_PROMPT = ChatPromptTemplate.from_template("""
         You are an expert job search strategist for the Indian job market.
         
         CANDIDATE PROFILE:
@@ -130,10 +113,88 @@ class JobDiscoveryAgent:
         - site:linkedin.com/jobs/view ai engineer noida gurgaon langchain
         
         Output EXACTLY and ONLY a valid JSON array of 8 strings. No markdown.
-        """
+        """)
+
+
+def extract_resume_profile(api_key: str):
+    """Reads the base resume PDF and uses Gemini to extract a structured profile."""
+    global _resume_profile_cache
+    if _resume_profile_cache:
+        return _resume_profile_cache
+
+    if not BASE_RESUME_PATH.exists():
+        logger.error("❌ No base_resume.pdf found! Upload it via the Settings tab.")
+        return None
+
+    logger.info("📄 Reading base_resume.pdf to build candidate profile...")
+    raw_text = load_pdf_text(BASE_RESUME_PATH)
+
+    # Lazy import, as in ResumeAgent.__init__
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        temperature=0.1,
+        google_api_key=api_key
+    )
+
+    chain = RESUME_PROFILE_PROMPT | llm | JsonOutputParser()
+
+    def invoke_profile_chain():
+        profile = chain.invoke({"resume": raw_text})
+        time.sleep(5)  # Cooldown after profile extraction call (not needed on a cache hit)
+        return profile
+
+    try:
+        profile = cached_gemini_json(
+            "resume_profile", RESUME_PROFILE_PROMPT, (raw_text,), invoke_profile_chain,
+            validate=lambda result: isinstance(result, dict)
+        )
+        logger.info(f"✅ Resume Profile Extracted: {profile.get('primary_role')} | Skills: {profile.get('top_skills')}")
+        _resume_profile_cache = profile
+        _resume_profile_cache["raw_text"] = raw_text
+        return _resume_profile_cache
+    except Exception as e:
+        logger.error(f"❌ Failed to extract resume profile: {e}")
+        return None
+
+
+def html_to_text(html: str, max_chars: int = 12000):
+    """Returns the visible body text of a job page, skipping <head> during parsing."""
+    soup = BeautifulSoup(html, 'html.parser', parse_only=BODY_STRAINER)
+    if not soup.find("body"):
+        # Malformed page without a <body>; parse everything
+        soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(NOISE_TAGS):
+        tag.extract()
+    return soup.get_text(separator=' ', strip=True)[:max_chars]
+
+
+def throttle_gemini():
+    """Blocks until the next Gemini call slot, shared across all worker threads."""
+    global _gemini_next_call_at
+    with _gemini_rate_lock:
+        now = time.monotonic()
+        wait = max(0.0, _gemini_next_call_at - now)
+        _gemini_next_call_at = max(now, _gemini_next_call_at) + GEMINI_MIN_INTERVAL
+    if wait:
+        time.sleep(wait)
+
+
+class JobDiscoveryAgent:
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        self.llm = ChatGoogleGenerativeAI(
+            model="gemini-2.5-flash",
+            temperature=0.3,
+            google_api_key=api_key
+        )
 
-        prompt = ChatPromptTemplate.from_template(template)
-        chain = prompt | self.llm | JsonOutputParser()
+    def generate_resume_queries(self, profile: dict):
+        """Uses the extracted resume profile to generate highly targeted search queries."""
+        logger.info("🧠 Generating resume-driven search queries...")
+
+        chain = SEARCH_QUERIES_PROMPT | self.llm | JsonOutputParser()
 
         try:
             queries = chain.invoke({
@@ -226,95 +287,172 @@ class JobDiscoveryAgent:
             db.close()
 
 
-def job_processing_worker():
-    """Background thread: scrapes JD, evaluates match, generates materials."""
-    logger.info("👷 Background processing worker started.")
-    while not KILL_SWITCH_EVENT.is_set():
-        try:
-            job_id, api_key = JOB_PROCESS_QUEUE.get(timeout=2)
-        except queue.Empty:
-            continue
+def fetch_page_html(url: str):
+    """Streams a page and returns at most MAX_SCRAPE_BYTES of it as text, or None on a non-200."""
+    with SCRAPE_SESSION.get(url, timeout=(5, 10), stream=True) as res:
+        if res.status_code != 200:
+            return None
+        chunks = []
+        total = 0
+        for chunk in res.iter_content(chunk_size=65536):
+            chunks.append(chunk)
+            total += len(chunk)
+            if total >= MAX_SCRAPE_BYTES:
+                logger.info(f"✂️ Page over {MAX_SCRAPE_BYTES // 1000} KB, truncated: {url}")
+                break
+        # Only trust an explicit charset; requests otherwise assumes ISO-8859-1 for text/*
+        declared = "charset" in res.headers.get("Content-Type", "").lower()
+        encoding = res.encoding if declared and res.encoding else "utf-8"
 
-        db: Session = SessionLocal()
-        try:
-            job = db.query(Job).filter(Job.id == job_id).first()
-            if not job or not api_key:
-                continue
+    raw = b"".join(chunks)
+    try:
+        return raw.decode(encoding, errors="replace")
+    except LookupError:
+        return raw.decode("utf-8", errors="replace")
 
-            logger.info(f"────────────────────────────────────")
-            logger.info(f"⚙️ PROCESSING JOB #{job.id}: {job.title}")
 
-            # 1. Scrape Full JD
-            try:
-                headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-                res = requests.get(job.url, headers=headers, timeout=10)
-                if res.status_code == 200:
-                    soup = BeautifulSoup(res.text, 'html.parser')
-                    for tag in soup(["script", "style", "nav", "footer", "header"]):
-                        tag.extract()
-                    job.description = soup.get_text(separator=' ', strip=True)[:12000]
-            except Exception:
-                pass  # Fall back to search snippet
-
-            # 2. Get Resume Text
-            if not _resume_profile_cache or "raw_text" not in _resume_profile_cache:
-                logger.warning(f"No cached resume text. Skipping Job #{job.id}")
-                job.status = "NO RESUME"
-                db.commit()
-                continue
+def scrape_job_description(job: Job):
+    """Replaces the search snippet with the full JD when the job page can be fetched."""
+    try:
+        html = fetch_page_html(job.url)
+        if html:
+            job.description = html_to_text(html)
+    except Exception:
+        pass  # Fall back to search snippet
 
-            raw_resume = _resume_profile_cache["raw_text"]
 
-            # 3. Evaluate Match Score
-            agent = ResumeAgent(api_key)
+def generate_application_materials(agent, job: Job, raw_resume: str):
+    """Writes the cover letter and compiles a tailored resume PDF for a high-match job."""
+    # One request covers both the gap analysis and the cover letter
+    throttle_gemini()
+    application = agent.prepare_application(raw_resume, job.description)
+    job.cover_letter = application["cover_letter"]
+    analysis = application["analysis"]
 
-            logger.info(f"🧠 Evaluating match score for Job #{job.id}...")
-            match_result = agent.evaluate_job_match(raw_resume, job.description)
-            job.match_score = match_result.get("score", 0)
-            job.match_reason = match_result.get("reason", "No reason provided.")
+    throttle_gemini()
+    latex_code = agent.generate_latex(raw_resume, job.description, analysis)
+    clean_code = clean_latex_code(latex_code)
 
-            time.sleep(8)  # Throttle for free tier (~10 RPM)
+    output_dir = Path(__file__).parent.resolve() / "resumes"
+    tex_path = output_dir / f"tailored_resume_job_{job.id}.tex"
+    pdf_path = output_dir / f"tailored_resume_job_{job.id}.pdf"
 
-            if job.match_score >= 70:
-                logger.info(f"🟢 High Match ({job.match_score}%). Generating materials...")
+    with open(tex_path, "w", encoding="utf-8") as f:
+        f.write(clean_code)
 
-                job.cover_letter = agent.generate_cover_letter(raw_resume, job.description)
-                time.sleep(8)
+    compile_latex_to_pdf(tex_path)
 
-                analysis = agent.analyze_gaps(raw_resume, job.description)
-                time.sleep(8)
+    if Path(pdf_path).exists():
+        job.tailored_resume_path = str(pdf_path)
+        job.status = "AUTO-GENERATED"
+        logger.info(f"🎉 Complete for Job #{job.id}!")
+    else:
+        job.status = "LATEX ERROR"
 
-                latex_code = agent.generate_latex(raw_resume, job.description, analysis)
-                clean_code = latex_code.replace("```latex", "").replace("```", "").strip()
 
-                output_dir = Path(__file__).parent.resolve() / "resumes"
-                tex_path = output_dir / f"tailored_resume_job_{job.id}.tex"
-                pdf_path = output_dir / f"tailored_resume_job_{job.id}.pdf"
+def process_job_batch(job_ids: list, api_key: str):
+    """Scrapes a batch of queued jobs, scores them in one Gemini request, then handles each result."""
+    db: Session = SessionLocal()
+    try:
+        jobs = db.query(Job).filter(Job.id.in_(job_ids)).all()
+        if not jobs or not api_key:
+            return
 
-                with open(tex_path, "w", encoding="utf-8") as f:
-                    f.write(clean_code)
+        # 1. Scrape Full JDs
+        for job in jobs:
+            logger.info(f"────────────────────────────────────")
+            logger.info(f"⚙️ PROCESSING JOB #{job.id}: {job.title}")
+            scrape_job_description(job)
+        db.commit()  # Keep the scraped JDs even if scoring fails below
 
-                cmd = ["pdflatex", "-interaction=nonstopmode", "-output-directory=.", tex_path.name]
-                subprocess.run(cmd, cwd=output_dir, capture_output=True, text=True)
+        # 2. Get Resume Text
+        if not _resume_profile_cache or "raw_text" not in _resume_profile_cache:
+            logger.warning(f"No cached resume text. Skipping Jobs {[job.id for job in jobs]}")
+            for job in jobs:
+                job.status = "NO RESUME"
+            db.commit()
+            return
 
-                if Path(pdf_path).exists():
-                    job.tailored_resume_path = str(pdf_path)
-                    job.status = "AUTO-GENERATED"
-                    logger.info(f"🎉 Complete for Job #{job.id}!")
-                else:
-                    job.status = "LATEX ERROR"
-            else:
-                logger.info(f"🔴 Low Match ({job.match_score}%). Skipped.")
-                job.status = "LOW MATCH"
+        raw_resume = _resume_profile_cache["raw_text"]
 
-            db.commit()
+        # 3. Evaluate Match Scores (one request for the whole batch)
+        agent = get_resume_agent(api_key)
 
+        logger.info(f"🧠 Evaluating match scores for {len(jobs)} job(s)...")
+        try:
+            # Throttled only if some JDs miss the cache and a request is actually sent
+            match_results = agent.evaluate_job_matches(
+                raw_resume, [job.description for job in jobs], before_call=throttle_gemini
+            )
         except Exception as e:
-            logger.error(f"❌ Worker Error on Job #{job_id}: {e}")
-            db.rollback()
+            # Fall back to one job per request so a single bad JD can't stall the whole batch
+            logger.warning(f"⚠️ Batched match scoring failed ({e}). Scoring jobs one at a time.")
+            match_results = []
+            for job in jobs:
+                try:
+                    match_results.append(
+                        agent.evaluate_job_matches(raw_resume, [job.description], before_call=throttle_gemini)[0]
+                    )
+                except Exception as job_error:
+                    logger.error(f"❌ Match scoring failed for Job #{job.id}: {job_error}")
+                    match_results.append(None)
+
+        scored_jobs = []
+        for job, match_result in zip(jobs, match_results):
+            if match_result is None:
+                job.status = "MATCH ERROR"
+                continue
+            job.match_score = match_result["score"]
+            job.match_reason = match_result["reason"]
+            scored_jobs.append(job)
+        db.commit()
+
+        # 4. Generate materials per job, so one failure doesn't lose the rest of the batch
+        for job in scored_jobs:
+            try:
+                if job.match_score >= 70:
+                    logger.info(f"🟢 High Match ({job.match_score}%) for Job #{job.id}. Generating materials...")
+                    generate_application_materials(agent, job, raw_resume)
+                else:
+                    logger.info(f"🔴 Low Match ({job.match_score}%) for Job #{job.id}. Skipped.")
+                    job.status = "LOW MATCH"
+                db.commit()
+            except Exception as e:
+                logger.error(f"❌ Worker Error on Job #{job.id}: {e}")
+                db.rollback()
+
+    except Exception as e:
+        logger.error(f"❌ Worker Error on Jobs {job_ids}: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+
+def job_processing_worker():
+    """Background thread: drains up to MATCH_BATCH_SIZE queued jobs at a time and processes them."""
+    logger.info("👷 Background processing worker started.")
+    while not KILL_SWITCH_EVENT.is_set():
+        try:
+            items = [JOB_PROCESS_QUEUE.get(timeout=2)]
+        except queue.Empty:
+            continue
+
+        while len(items) < MATCH_BATCH_SIZE:
+            try:
+                items.append(JOB_PROCESS_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+
+        try:
+            # Jobs queued by an earlier agent run may carry a different key
+            batches = {}
+            for job_id, api_key in items:
+                batches.setdefault(api_key, []).append(job_id)
+            for api_key, job_ids in batches.items():
+                process_job_batch(job_ids, api_key)
         finally:
-            db.close()
-            JOB_PROCESS_QUEUE.task_done()
+            for _ in items:
+                JOB_PROCESS_QUEUE.task_done()
 
 
 def discovery_loop(api_key: str, interval_minutes: int = 60):
@@ -347,12 +485,12 @@ def discovery_loop(api_key: str, interval_minutes: int = 60):
 
 
 _agent_thread = None
-_worker_thread = None
+_worker_threads = []
 
 
-def start_agent_thread(api_key: str = "", interval_minutes: int = 60, **kwargs):
-    """Starts the discovery + worker threads. Only needs api_key now."""
-    global _agent_thread, _worker_thread, _resume_profile_cache
+def start_agent_thread(api_key: str = "", interval_minutes: int = 60, workers: int = 1, **kwargs):
+    """Starts the discovery thread plus `workers` processing threads. Only needs api_key now."""
+    global _agent_thread, _worker_threads, _resume_profile_cache
 
     if _agent_thread and _agent_thread.is_alive():
         return False
@@ -368,12 +506,15 @@ def start_agent_thread(api_key: str = "", interval_minutes: int = 60, **kwargs):
     )
     _agent_thread.start()
 
-    if _worker_thread is None or not _worker_thread.is_alive():
-        _worker_thread = threading.Thread(
+    # Jobs write to per-job .tex/.pdf names, so workers never share LaTeX output files
+    _worker_threads = [t for t in _worker_threads if t.is_alive()]
+    for _ in range(max(1, workers) - len(_worker_threads)):
+        worker = threading.Thread(
             target=job_processing_worker,
             daemon=True
         )
-        _worker_thread.start()
+        worker.start()
+        _worker_threads.append(worker)
 
     return True
 
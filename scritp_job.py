@@ -36,16 +36,14 @@ except ImportError:
     RICH = False
     console = None
 
+# Strips rich markup tags like [bold] / [/green] for plain-print fallback
+RICH_MARKUP_RE = re.compile(r"\[.*?\]")
+
 try:
     import pandas as pd
 except ImportError:
     sys.exit("❌  pandas missing.  Run: pip install python-jobspy pandas openpyxl rich")
 
-try:
-    from jobspy import scrape_jobs
-except ImportError:
-    sys.exit("❌  jobspy missing.  Run: pip install python-jobspy")
-
 
 # ══════════════════════════════════════════════════════════════════════════════
 #  CONFIG  — edit here, or override everything via CLI flags
@@ -128,21 +126,35 @@ DEFAULTS: dict = {
 #  RELEVANCE SCORING
 # ══════════════════════════════════════════════════════════════════════════════
 
-def compute_relevance(row: pd.Series, keywords: list[str]) -> int:
-    text = " ".join(
-        str(row.get(col) or "")
-        for col in ["title", "company", "description", "location"]
-    ).lower()
+def compile_keywords(keywords: list[str]) -> list[re.Pattern]:
+    # Compile once per run; str.contains reuses each compiled pattern for every row
+    return [re.compile(kw, re.IGNORECASE) for kw in keywords]
+
+
+def _text_col(jobs: pd.DataFrame, col: str) -> pd.Series:
+    if col not in jobs.columns:
+        return pd.Series("", index=jobs.index)
+    return jobs[col].fillna("").astype(str)
+
+
+def compute_relevance(jobs: pd.DataFrame, patterns: list[re.Pattern]) -> pd.Series:
+    # Column-wise: one str.contains pass per keyword over all rows, no per-row apply
+    text = (
+        _text_col(jobs, "title") + " " + _text_col(jobs, "company") + " "
+        + _text_col(jobs, "description") + " " + _text_col(jobs, "location")
+    ).str.lower()
 
-    score = sum(1 for kw in keywords if re.search(kw, text, re.IGNORECASE))
+    score = pd.Series(0, index=jobs.index)
+    for pat in patterns:
+        score += text.str.contains(pat, regex=True).astype(int)
 
     # Bonus: salary present
-    if pd.notna(row.get("min_amount")) and (row.get("min_amount") or 0) > 0:
-        score += 1
+    if "min_amount" in jobs.columns:
+        min_amount = pd.to_numeric(jobs["min_amount"], errors="coerce").fillna(0)
+        score += (min_amount > 0).astype(int)
     # Bonus: direct apply URL
-    url = str(row.get("job_url") or "")
-    if url and not url.startswith("https://www.google"):
-        score += 1
+    url = _text_col(jobs, "job_url")
+    score += ((url != "") & ~url.str.startswith("https://www.google")).astype(int)
 
     return score
 
@@ -152,6 +164,12 @@ def compute_relevance(row: pd.Series, keywords: list[str]) -> int:
 # ══════════════════════════════════════════════════════════════════════════════
 
 def run(cfg: dict) -> pd.DataFrame:
+    # Imported here, not at module load, so `--help` and arg errors don't pay for jobspy's import
+    try:
+        from jobspy import scrape_jobs
+    except ImportError:
+        sys.exit("❌  jobspy missing.  Run: pip install python-jobspy")
+
     log = console.print if RICH else print
 
     if RICH:
@@ -205,9 +223,8 @@ def run(cfg: dict) -> pd.DataFrame:
     log(f"\n✅  [bold]{raw}[/bold] raw listings retrieved" if RICH else f"\n✅  {raw} raw listings retrieved")
 
     # Score
-    jobs["relevance_score"] = jobs.apply(
-        lambda r: compute_relevance(r, cfg["relevance_keywords"]), axis=1
-    )
+    patterns = compile_keywords(cfg["relevance_keywords"])
+    jobs["relevance_score"] = compute_relevance(jobs, patterns)
 
     # Filter
     if cfg["min_score"] > 0:
@@ -315,8 +332,14 @@ def display_table(jobs: pd.DataFrame, top_n: int) -> None:
 #  SAVE: CSV + EXCEL
 # ══════════════════════════════════════════════════════════════════════════════
 
+SLUG_RE = re.compile(r"[^a-z0-9]+")
+
+# One-pass sheet-name cleanup: "_" → space, drop characters Excel rejects in sheet names
+SHEET_NAME_TABLE = str.maketrans({"_": " ", **{ch: None for ch in "[]:*?/\\"}})
+
+
 def save_outputs(jobs: pd.DataFrame, role: str) -> None:
-    slug = re.sub(r"[^a-z0-9]+", "_", role.lower()).strip("_")
+    slug = SLUG_RE.sub("_", role.lower()).strip("_")
     ts   = datetime.now().strftime("%Y%m%d_%H%M")
     base = Path(f"ds_jobs_{slug}_{ts}")
 
@@ -342,7 +365,7 @@ def save_outputs(jobs: pd.DataFrame, role: str) -> None:
             # Sheet 3 — Per-board
             if "site" in jobs.columns:
                 for site, grp in jobs.groupby("site"):
-                    sname = str(site).replace("_", " ").title()[:31]
+                    sname = str(site).translate(SHEET_NAME_TABLE).title()[:31]
                     grp[keep].to_excel(writer, sheet_name=sname, index=True, index_label="rank")
 
             # Format Top 25 sheet
@@ -446,4 +469,4 @@ if __name__ == "__main__":
         f"top score [green]{jobs['relevance_score'].max()}[/green]  •  "
         f"avg [dim]{jobs['relevance_score'].mean():.1f}[/dim]"
     )
-    log(summary if RICH else re.sub(r"\[.*?\]", "", summary))
+    log(summary if RICH else RICH_MARKUP_RE.sub("", summary))